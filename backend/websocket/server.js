@@ -1,6 +1,10 @@
 const WebSocket = require('ws');
 const Procedure = require('../models/Procedure');
 
+// Binary frame from Dragon: opcode byte, float64 LE timestamp, UTF-8 text
+const TRANSCRIPTION_OPCODE = 0x01;
+const TRANSCRIPTION_HEADER_SIZE = 9;
+
 class WebSocketServer {
   constructor(server) {
     this.wss = new WebSocket.Server({ server });
@@ -49,8 +53,35 @@ class WebSocketServer {
   }
 
   handleMessage(clientId, data) {
+    let parsed;
+    try {
+      // JSON frames start with '{' or '[', so the opcode byte is unambiguous
+      if (Buffer.isBuffer(data) && data[0] === TRANSCRIPTION_OPCODE) {
+        if (data.length < TRANSCRIPTION_HEADER_SIZE) {
+          throw new RangeError(`Transcription frame too short: ${data.length} bytes`);
+        }
+        parsed = {
+          type: 'voice_transcription',
+          timestamp: data.readDoubleLE(1),
+          text: data.toString('utf8', TRANSCRIPTION_HEADER_SIZE)
+        };
+      } else {
+        parsed = JSON.parse(data);
+      }
+    } catch (error) {
+      console.error('Error handling message:', error);
+      return;
+    }
+
+    // Dragon coalesces messages queued in the same tick into one array frame
+    const messages = Array.isArray(parsed) ? parsed : [parsed];
+    for (const message of messages) {
+      this.dispatchMessage(clientId, message);
+    }
+  }
+
+  dispatchMessage(clientId, message) {
     try {
-      const message = JSON.parse(data);
       const client = this.clients.get(clientId);
 
       console.log(`📨 Message from ${clientId}:`, message.type);
@@ -64,6 +95,10 @@ class WebSocketServer {
           this.handleVoiceTranscription(clientId, message);
           break;
         
+        case 'voice_transcription_partial':
+          this.handlePartialTranscription(clientId, message);
+          break;
+        
         case 'voice_command':
           this.handleVoiceCommand(clientId, message);
           break;
@@ -114,6 +149,16 @@ class WebSocketServer {
     });
   }
 
+  handlePartialTranscription(clientId, message) {
+    // Dragon streams text while Whisper is still decoding
+    this.broadcastToType('ui', {
+      type: 'transcription',
+      text: message.text,
+      partial: true,
+      timestamp: new Date()
+    });
+  }
+
   handleVoiceCommand(clientId, message) {
     // Dragon sends parsed command
     console.log(`🎤 Voice command: ${message.command}`, message.params);
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Dragon Dictation - Thin Client
+Sends terminal commands to a running dragon_daemon.py over its UNIX socket,
+so reconnecting over SSH never reloads the Whisper model
+"""
+import argparse
+import json
+import socket
+import struct
+import sys
+
+# --- Configuration ---
+SOCKET_PATH = "/tmp/dragon.sock"
+_HEADER = struct.Struct(">I")  # 4-byte big-endian payload length
+HEADER_SIZE = _HEADER.size
+
+
+def encode_frame(message: dict) -> bytes:
+    """Length-prefixed JSON frame shared with the daemon"""
+    payload = json.dumps(message).encode("utf-8")
+    return _HEADER.pack(len(payload)) + payload
+
+
+def decode_header(header: bytes) -> int:
+    """Payload length from a frame header of HEADER_SIZE bytes"""
+    (length,) = _HEADER.unpack(header)
+    return length
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Daemon closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+def send_command(sock: socket.socket, cmd: str) -> str:
+    """Run one command on the daemon and return its terminal output"""
+    sock.sendall(encode_frame({"command": cmd}))
+    length = decode_header(_recv_exactly(sock, HEADER_SIZE))
+    return json.loads(_recv_exactly(sock, length))["output"]
+
+
+def run_interactive(sock: socket.socket):
+    print("✅ Connected to Dragon daemon. Type 'help' for commands.\n")
+    while True:
+        try:
+            cmd = input(">>> ").strip().lower()
+        except (KeyboardInterrupt, EOFError):
+            print()
+            break
+
+        if not cmd:
+            continue
+        if cmd in ['quit', 'q', 'exit']:
+            break
+
+        print(send_command(sock, cmd), end="")
+
+    print("👋 Disconnected (daemon keeps running)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dragon Dictation - Thin client for dragon_daemon.py"
+    )
+    parser.add_argument(
+        "--socket",
+        default=SOCKET_PATH,
+        help="Daemon UNIX socket path"
+    )
+    parser.add_argument(
+        "command",
+        nargs="*",
+        help="Run a single command and exit (default: interactive)"
+    )
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"❌ No daemon listening on {args.socket}. Start it with: python dragon_daemon.py",
+              file=sys.stderr)
+        sys.exit(1)
+
+    with sock:
+        try:
+            if args.command:
+                print(send_command(sock, " ".join(args.command).lower()), end="")
+            else:
+                run_interactive(sock)
+        except ConnectionError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Dragon Dictation - Shared Core
+Recording, model loading, transcription and voice-command handling
+shared by the headless, SSH and integrated GUI front ends
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+
+# Core Libraries
+import numpy as np
+import sounddevice as sd
+
+# Import our custom modules
+from vascular_commands import VascularCommandParser
+from websocket_client import WebSocketClient
+
+try:
+    import uvloop  # Optional: faster event loop for the WebSocket client
+except ImportError:
+    uvloop = None
+
+try:
+    import psutil  # Optional: physical core count for CPU inference
+except ImportError:
+    psutil = None
+
+# faster-whisper is imported when the model loads; only check it is installed
+if importlib.util.find_spec("faster_whisper") is None:
+    print("\n[ERROR] faster-whisper not installed. Run: pip install faster-whisper\n", file=sys.stderr)
+    sys.exit(1)
+
+# --- Configuration ---
+DEFAULT_SR = 16000
+CHANNELS = 1
+MAX_SECONDS = 60  # Initial recording buffer length; grows if exceeded
+CHUNK_SECONDS = 30  # Whisper's window; Recorder.on_chunk gets audio at most this long
+CUT_SEARCH_SECONDS = 2  # Chunks are cut at the quietest point of their last seconds
+CUT_FRAME_MS = 20  # Frame length for finding that point
+WARMUP_INTERVAL = 240  # Re-warm the model after this many idle seconds
+CONFIG_DIR = Path("config")
+
+# Loaded models, keyed by (size, device, compute_type, download_root, cpu_threads)
+_MODEL_CACHE = {}
+
+
+def load_json(path: Path) -> dict:
+    if not path.exists():
+        print(f"⚠️ Warning: {path} not found")
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_hotwords(path: Path) -> tuple[frozenset, str]:
+    """Return the hotwords and the Whisper prompt built from them"""
+    if not path.exists():
+        print(f"⚠️ Warning: {path} not found")
+        return frozenset(), ""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return frozenset(lines), ", ".join(lines)
+
+
+def scan_placeholders(text: str):
+    """Yield (offset, name) for every {name} placeholder in text"""
+    # str.find is a C-level memchr scan; no match objects are created
+    find = text.find
+    start = find("{")
+    while start != -1:
+        end = find("}", start + 1)
+        if end == -1:
+            return
+        if end > start + 1:
+            yield start, text[start + 1:end]
+            start = find("{", end + 1)
+        else:
+            start = find("{", start + 1)
+
+
+@lru_cache(maxsize=64)
+def render_macro(template: str, day: date) -> str:
+    """Macro text with {date} filled in; cached per template and day"""
+    return template.replace("{date}", day.strftime("%B %d, %Y"))
+
+
+def resolve_device(device: str) -> str:
+    """Turn 'auto' into 'cuda' or 'cpu'"""
+    if device == "auto":
+        import ctranslate2
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    return device
+
+
+def resolve_compute_type(device: str, compute_type: str) -> str:
+    """Pick an int8 compute type unless one was given explicitly"""
+    if compute_type != "default":
+        return compute_type
+    return "int8_float16" if resolve_device(device) == "cuda" else "int8"
+
+
+def physical_cores() -> int:
+    """Physical (not hyperthreaded) core count, falling back to logical CPUs"""
+    count = psutil.cpu_count(logical=False) if psutil is not None else None
+    return count or os.cpu_count() or 1
+
+
+def pin_to_physical_cores(threads: int = 0):
+    """
+    Confine the process to one logical CPU per physical core (Linux only).
+
+    Opt-in: the audio callback, UI and event loop threads are confined too,
+    so call it once at startup, before the model spawns its threads.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    threads = threads or physical_cores()
+    cores = {}  # sibling group -> first logical CPU in it
+    for cpu in sorted(os.sched_getaffinity(0)):
+        siblings = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list")
+        try:
+            cores.setdefault(siblings.read_text().strip(), cpu)
+        except OSError:
+            return
+    # More threads than cores: pinning would only make them share cores
+    if threads <= len(cores):
+        os.sched_setaffinity(0, sorted(cores.values())[:threads])
+
+
+def load_whisper_model(model_size: str, device: str = "auto", compute_type: str = "default",
+                       download_root: str | None = None, cpu_threads: int = 0):
+    """Load a WhisperModel once per process, preferring weights already on disk"""
+    device = resolve_device(device)
+    compute_type = resolve_compute_type(device, compute_type)
+    if device == "cpu":
+        # One GEMM thread per physical core; hyperthread siblings only contend
+        cpu_threads = cpu_threads or physical_cores()
+    key = (model_size, device, compute_type, download_root, cpu_threads)
+    model = _MODEL_CACHE.get(key)
+    if model is None:
+        from faster_whisper import WhisperModel
+        kwargs = dict(device=device, compute_type=compute_type,
+                      cpu_threads=cpu_threads, download_root=download_root)
+        try:
+            # Skip the Hugging Face Hub round-trip when the weights are cached
+            model = WhisperModel(model_size, local_files_only=True, **kwargs)
+        except FileNotFoundError:
+            model = WhisperModel(model_size, **kwargs)
+        _MODEL_CACHE[key] = model
+    return model
+
+
+def warm_up(model):
+    """Run a second of silence through the model to prime its kernels"""
+    silence = np.zeros(DEFAULT_SR, dtype=np.float32)
+    segments, _ = model.transcribe(
+        silence, beam_size=1, language="en", vad_filter=False
+    )
+    list(segments)
+
+
+def start_event_loop() -> asyncio.AbstractEventLoop:
+    """Run an event loop forever in a daemon thread and return it"""
+    loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+# No gain is applied: scaling quiet or silent audio up to full scale lifts
+# the noise floor past VAD and invites Whisper hallucinations
+def to_float32(samples: np.ndarray) -> np.ndarray:
+    """Convert raw int16 samples to float32 in [-1, 1], minus any DC offset"""
+    buf = samples.astype(np.float32)
+    if buf.size:
+        buf -= buf.mean()
+    buf /= 32768.0
+    return buf
+
+
+class DragonBase(ABC):
+    """
+    Transcription and command handling shared by every front end.
+
+    Subclasses own the procedure buffer and the user-facing output by
+    implementing notify() and the buffer methods below; one that misses any
+    of them fails when it is constructed, before the model loads.
+    """
+
+    # Set to a method to get each full Recorder chunk while recording goes on
+    _on_chunk = None
+
+    def __init__(self, model_size="small.en", device="auto", compute_type="default",
+                 backend_uri="ws://localhost:3000", beam_size=1, model_path=None,
+                 cpu_threads=0):
+        self.is_recording = False
+        self.beam_size = beam_size
+        self.recorder = Recorder(on_chunk=self._on_chunk)
+        self.macros = MappingProxyType(load_json(CONFIG_DIR / "macros.json"))
+        self.hotwords, self._initial_prompt = load_hotwords(CONFIG_DIR / "hotwords.txt")
+        self.current_procedure_id = None
+
+        # Initialize command parser
+        self.parser = VascularCommandParser()
+
+        # Initialize WebSocket client
+        self.ws_client = WebSocketClient(uri=backend_uri)
+        self.ws_connected = False
+        self._loop = None
+
+        print(f"🔄 Loading Whisper model '{model_size}'...")
+        from faster_whisper import BatchedInferencePipeline
+        self.model = BatchedInferencePipeline(model=load_whisper_model(
+            model_size, device, compute_type,
+            download_root=model_path, cpu_threads=cpu_threads
+        ))
+        self._last_inference = time.monotonic()
+        warm_up(self.model)
+        threading.Thread(target=self._keep_warm, daemon=True).start()
+        print("✅ Model loaded successfully.")
+
+    # --- Output sink, implemented by subclasses ---
+
+    @abstractmethod
+    def notify(self, message: str, level: str = "info"):
+        """Show a status message; level is 'ok', 'info', 'warn' or 'error'"""
+
+    @abstractmethod
+    def get_buffer(self) -> str:
+        ...
+
+    @abstractmethod
+    def set_buffer(self, text: str):
+        ...
+
+    @abstractmethod
+    def append_text(self, text: str):
+        ...
+
+    @abstractmethod
+    def fill_field(self, field: str, value: str) -> bool:
+        """Replace the first {field} placeholder; False if there is none"""
+
+    # --- Shared behaviour ---
+
+    def _keep_warm(self):
+        """Re-warm the model when idle so the next utterance stays fast"""
+        while True:
+            time.sleep(WARMUP_INTERVAL)
+            idle = time.monotonic() - self._last_inference
+            if not self.is_recording and idle >= WARMUP_INTERVAL:
+                self._last_inference = time.monotonic()
+                warm_up(self.model)
+
+    def _submit(self, coro):
+        """Schedule a coroutine on the background event loop"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def connect_to_backend(self):
+        """Connect to backend server via WebSocket"""
+        try:
+            await self.ws_client.connect()
+            self.ws_connected = True
+            print("✅ Connected to backend server")
+        except Exception as e:
+            print(f"❌ Failed to connect to backend: {e}")
+            print("⚠️ Running in offline mode")
+            self.ws_connected = False
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        """Transcribe audio, streaming partial text to the backend"""
+        self._last_inference = time.monotonic()
+        segments, _ = self.model.transcribe(
+            audio,
+            beam_size=self.beam_size,
+            batch_size=8,
+            language="en",
+            temperature=0,
+            condition_on_previous_text=False,
+            without_timestamps=True,
+            vad_filter=True,
+            vad_parameters={"min_silence_duration_ms": 500},
+            initial_prompt=self._initial_prompt
+        )
+
+        # Stream segments to the UI as Whisper yields them
+        parts = []
+        for segment in segments:
+            parts.append(segment.text)
+            if self.ws_connected:
+                self._submit(self.ws_client.send_partial("".join(parts).strip()))
+
+        return "".join(parts).strip()
+
+    def handle_transcription(self, text: str):
+        """Apply a finished transcription and forward it to the backend"""
+        result = self.process_command(text)
+
+        if self.ws_connected:
+            self._submit(self.publish(text, result))
+
+    def process_command(self, text: str):
+        """Process transcribed text for commands"""
+        # Try to parse as vascular command
+        result = self.parser.parse(text)
+
+        if result:
+            command_type, params = result
+            print(f"✅ Command: {command_type}")
+            print(f"   Params: {params}")
+
+            # Handle different command types
+            if command_type == "insert_macro":
+                self.handle_insert_macro(params)
+
+            elif command_type == "set_field":
+                self.handle_set_field(params)
+
+            elif command_type == "set_vessel_field":
+                self.handle_set_vessel_field(params)
+
+            elif command_type == "save_procedure":
+                if self.ws_connected:
+                    self._submit(self.save_procedure(self.get_buffer()))
+                else:
+                    self.notify("Cannot save - backend not connected", "warn")
+
+            elif command_type == "clear_buffer":
+                self.set_buffer("")
+                self.notify("Buffer cleared", "warn")
+
+            elif command_type == "show_fields":
+                self.show_remaining_fields()
+
+        else:
+            # Not a command, just append text
+            self.append_text(" " + text)
+            self.notify("Added to buffer")
+
+        return result
+
+    async def publish(self, text: str, result):
+        """Send the transcription and its parsed command in one loop pass"""
+        sends = [self.ws_client.send_transcription(text)]
+        if result:
+            sends.append(self.ws_client.send_command(*result))
+        await asyncio.gather(*sends)
+
+    def handle_insert_macro(self, params):
+        """Insert a macro template"""
+        macro_name = params.get("macro_name", "vascular_procedure")
+
+        if macro_name in self.macros:
+            template = render_macro(self.macros[macro_name], date.today())
+
+            self.set_buffer(template)
+            self.notify(f"Loaded template: {macro_name}", "ok")
+        else:
+            self.notify(f"Macro not found: {macro_name}", "error")
+
+    def handle_set_field(self, params):
+        """Set a standard procedure field"""
+        field = params.get("field")
+        value = params.get("value")
+
+        if self.fill_field(field, value):
+            self.notify(f"Set {field} = {value}", "ok")
+        else:
+            self.notify(f"Field {field} not found in buffer", "warn")
+
+    def handle_set_vessel_field(self, params):
+        """Set a vessel-specific field"""
+        vessel = params.get("vessel")
+        prop = params.get("property")
+        value = params.get("value")
+
+        if self.fill_field(f"{vessel}_{prop}", value):
+            self.notify(f"Set {vessel} {prop} = {value}", "ok")
+        else:
+            # Try alternate format
+            vessel_text = f"Occlusion: {value}" if prop == "occlusion_length" else f"Treatment: {value}"
+            if self.fill_field(vessel, vessel_text):
+                self.notify(f"Updated {vessel}", "ok")
+            else:
+                self.notify(f"Field {vessel}_{prop} not found in buffer", "warn")
+
+    def remaining_fields(self) -> list:
+        """Names of the placeholders still left in the buffer"""
+        return [name for _, name in scan_placeholders(self.get_buffer())]
+
+    def show_remaining_fields(self):
+        """Show remaining unfilled fields"""
+        fields = self.remaining_fields()
+
+        if fields:
+            fields_str = ", ".join(fields[:5])
+            if len(fields) > 5:
+                fields_str += f"... ({len(fields)} total)"
+            self.notify(f"Remaining fields: {fields_str}")
+        else:
+            self.notify("All fields filled!", "ok")
+
+    async def save_procedure(self, narrative: str):
+        """Save procedure to backend database"""
+        # Runs on the event loop thread
+        try:
+            await self.ws_client.send_command("save_procedure", {
+                "narrative": narrative,
+                "status": "completed"
+            })
+
+            self.notify("Procedure saved to database!", "ok")
+        except Exception as e:
+            print(f"❌ Error saving procedure: {e}")
+            self.notify(f"Save failed: {e}", "error")
+
+
+class NarrativeBuffer:
+    """
+    Procedure text kept as a list of segments, with every {placeholder} in a
+    segment of its own, so filling a field is a single list assignment
+    instead of a copy of the whole narrative.
+    """
+    def __init__(self, text: str = ""):
+        self.set(text)
+
+    def set(self, text: str):
+        self._segments = []
+        self._placeholders = {}  # field -> indices of its unfilled segments
+        self.append(text)
+
+    def append(self, text: str):
+        pos = 0
+        for start, field in scan_placeholders(text):
+            if start > pos:
+                self._segments.append(text[pos:start])
+            self._placeholders.setdefault(field, []).append(len(self._segments))
+            pos = start + len(field) + 2
+            self._segments.append(text[start:pos])
+        if pos < len(text):
+            self._segments.append(text[pos:])
+
+    def fill(self, field: str, value: str) -> bool:
+        """Replace the first unfilled {field}; False if there is none"""
+        indices = self._placeholders.get(field)
+        if not indices:
+            return False
+        self._segments[indices.pop(0)] = value
+        if not indices:
+            del self._placeholders[field]
+        return True
+
+    def remaining_fields(self) -> list:
+        """Unfilled placeholder names in narrative order"""
+        entries = sorted(
+            (idx, field)
+            for field, indices in self._placeholders.items()
+            for idx in indices
+        )
+        return [field for _, field in entries]
+
+    def __str__(self) -> str:
+        return "".join(self._segments)
+
+    def __bool__(self) -> bool:
+        return any(self._segments)
+
+
+_ICONS = {"ok": "✅", "info": "📝", "warn": "⚠️", "error": "❌"}
+
+
+class TerminalDragon(DragonBase):
+    """DragonBase for the terminal front ends: a NarrativeBuffer and stdout"""
+
+    def __init__(self, *args, **kwargs):
+        self.buffer = NarrativeBuffer()
+        super().__init__(*args, **kwargs)
+
+    def notify(self, message: str, level: str = "info"):
+        print(f"{_ICONS.get(level, '')} {message}")
+
+    def get_buffer(self) -> str:
+        return str(self.buffer)
+
+    def set_buffer(self, text: str):
+        self.buffer.set(text)
+
+    def append_text(self, text: str):
+        self.buffer.append(text)
+
+    def fill_field(self, field: str, value: str) -> bool:
+        return self.buffer.fill(field, value)
+
+    def remaining_fields(self) -> list:
+        """Unfilled placeholders in buffer order, straight from the index"""
+        return self.buffer.remaining_fields()
+
+    def show_remaining_fields(self):
+        """Show remaining unfilled fields"""
+        fields = self.remaining_fields()
+
+        if fields:
+            print(f"\n📋 Remaining fields ({len(fields)}):")
+            for i, field in enumerate(fields[:10], 1):
+                print(f"   {i}. {field}")
+            if len(fields) > 10:
+                print(f"   ... and {len(fields) - 10} more")
+        else:
+            print("✅ All fields filled!")
+
+
+class Recorder:
+    """
+    Simple audio recorder.
+
+    If on_chunk is given, it is called from the audio thread with each
+    CHUNK_SECONDS of raw int16 samples while recording continues, so they
+    can be transcribed early; it must only hand the chunk off. Each chunk is
+    cut at the quietest frame of its last CUT_SEARCH_SECONDS, with the rest
+    carried into the next one, so words are not split across chunks.
+    """
+    def __init__(self, samplerate=DEFAULT_SR, channels=CHANNELS, on_chunk=None):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.on_chunk = on_chunk
+        self._buf = np.empty(0, dtype=np.int16)
+        self._write_idx = 0
+        self._chunk_start = 0
+        self._stream = None
+
+    def start_recording(self):
+        # Fresh buffer per recording: the previous one may still be in use
+        # by a transcription that has not finished yet.
+        self._buf = np.empty(self.samplerate * MAX_SECONDS, dtype=np.int16)
+        self._write_idx = 0
+        self._chunk_start = 0
+        if self._stream is None:
+            # Opened once and only started/stopped per recording, which
+            # saves reopening the PortAudio device on every toggle.
+            # Raw int16 frames: half the bytes of float32 and no per-callback array
+            self._stream = sd.RawInputStream(
+                samplerate=self.samplerate,
+                channels=self.channels,
+                callback=self._callback,
+                dtype='int16'
+            )
+        self._stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        samples = np.frombuffer(indata, dtype=np.int16)[::self.channels]
+        end = self._write_idx + frames
+        if end > len(self._buf):
+            self._buf = np.resize(self._buf, max(end, 2 * len(self._buf)))
+        self._buf[self._write_idx:end] = samples
+        self._write_idx = end
+
+        if self.on_chunk and end - self._chunk_start >= self.samplerate * CHUNK_SECONDS:
+            cut = self._quietest_cut(end)
+            # A view is safe: the buffer is never rewritten, only regrown
+            self.on_chunk(self._buf[self._chunk_start:cut])
+            self._chunk_start = cut
+
+    def _quietest_cut(self, end: int) -> int:
+        """Index at the middle of the lowest-energy frame before end"""
+        frame = self.samplerate * CUT_FRAME_MS // 1000
+        count = self.samplerate * CUT_SEARCH_SECONDS // frame
+        start = end - count * frame
+        frames = self._buf[start:end].astype(np.float32).reshape(count, frame)
+        quietest = int(np.argmin(np.square(frames).sum(axis=1)))
+        return start + quietest * frame + frame // 2
+
+    def stop_recording(self) -> np.ndarray | None:
+        """Return the audio not yet passed to on_chunk as mono float32 samples"""
+        if not self._stream or not self._stream.active:
+            return None
+        self._stream.stop()
+
+        if self._write_idx == self._chunk_start:
+            return None
+        return to_float32(self._buf[self._chunk_start:self._write_idx])
+
+
+class ChunkDecoder:
+    """
+    One decoding thread that transcribes queued audio in submission order.
+
+    Each piece gets its own transcribe call (the pipeline still batches the
+    piece's 30 s windows), so no segment can be credited to the wrong piece.
+    """
+    def __init__(self, transcribe):
+        self._transcribe = transcribe  # audio -> iterable of segments
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, audio: np.ndarray) -> Future:
+        """Queue float32 audio (or a raw int16 Recorder chunk); the Future yields its text"""
+        future = Future()
+        self._queue.put((audio, future))
+        return future
+
+    def _run(self):
+        while True:
+            audio, future = self._queue.get()
+            try:
+                future.set_result(self._decode(audio))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _decode(self, audio: np.ndarray) -> str:
+        if audio.dtype != np.float32:
+            audio = to_float32(audio)
+        return "".join(s.text for s in self._transcribe(audio)).strip()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Dragon Dictation - Daemon Mode
+Loads the Whisper model once and serves SSH-server commands over a UNIX socket.
+Use dragon_client.py from any terminal or SSH session to drive it.
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import io
+import json
+import os
+import sys
+
+from dragon_client import HEADER_SIZE, SOCKET_PATH, decode_header, encode_frame
+from dragon_core import pin_to_physical_cores
+from dragon_ssh_server import SSHDragonServer
+
+# Where print() output goes for the command running in this context
+_client_output = contextvars.ContextVar("client_output", default=None)
+
+
+class ContextStdout(io.TextIOBase):
+    """
+    sys.stdout stand-in that sends writes to the current client's buffer.
+
+    Unlike contextlib.redirect_stdout it is per context, not process-wide:
+    prints from unrelated threads still reach the daemon's terminal.
+    """
+    def __init__(self, fallback):
+        self._fallback = fallback
+
+    def _target(self):
+        return _client_output.get() or self._fallback
+
+    def write(self, s: str) -> int:
+        return self._target().write(s)
+
+    def flush(self):
+        self._target().flush()
+
+
+async def read_frame(reader: asyncio.StreamReader) -> dict | None:
+    """
+    Read one length-prefixed JSON frame; None when the client hangs up.
+
+    Raises ValueError for a payload that is not a JSON object; the frame is
+    consumed either way, so the connection stays usable.
+    """
+    try:
+        length = decode_header(await reader.readexactly(HEADER_SIZE))
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    request = json.loads(payload)
+    if not isinstance(request, dict):
+        raise ValueError("frame is not a JSON object")
+    return request
+
+
+class DragonDaemon:
+    """Owns one SSHDragonServer (and its model) for every client session"""
+
+    def __init__(self, server: SSHDragonServer, socket_path: str = SOCKET_PATH):
+        self.server = server
+        self.socket_path = socket_path
+        self._lock = asyncio.Lock()
+
+    def _run_command(self, cmd: str) -> str:
+        """Run a command and capture what it prints for the client"""
+        output = io.StringIO()
+        token = _client_output.set(output)
+        try:
+            self.server.handle_command(cmd)
+            # One reply per command: let a background transcription finish first
+            in_flight, self.server.in_flight = self.server.in_flight, None
+            if in_flight is not None:
+                in_flight.result()
+        except Exception as e:
+            # Report to the client instead of dropping its connection
+            print(f"❌ Error running '{cmd}': {e}")
+        finally:
+            _client_output.reset(token)
+        return output.getvalue()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await read_frame(reader)
+                except ValueError as e:
+                    output = f"❌ Malformed request: {e}\n"
+                else:
+                    if request is None:
+                        break
+                    # One command at a time: clients share the recorder and buffer.
+                    # Commands block (recording, transcription), so run them off the loop.
+                    async with self._lock:
+                        output = await loop.run_in_executor(
+                            None, self._run_command, request.get("command", "")
+                        )
+                writer.write(encode_frame({"output": output}))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+
+        # Owner-only from the moment it exists: a chmod after bind would leave
+        # a window for other local users to record from the mic or read the narrative
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+
+        print(f"🎧 Listening on {self.socket_path} - connect with: python dragon_client.py")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dragon Dictation - Daemon Mode (model stays loaded between SSH sessions)"
+    )
+    parser.add_argument(
+        "--model",
+        default="small.en",
+        help="Faster-Whisper model size"
+    )
+    parser.add_argument(
+        "--device",
+        default="auto",
+        help="Device ('cpu', 'cuda', 'auto')"
+    )
+    parser.add_argument(
+        "--compute_type",
+        default="default",
+        help="Compute type (default: int8 on CPU, int8_float16 on CUDA)"
+    )
+    parser.add_argument(
+        "--backend",
+        default="ws://localhost:3000",
+        help="Backend WebSocket URI"
+    )
+    parser.add_argument(
+        "--beam_size",
+        type=int,
+        default=1,
+        help="Decoder beam width (greedy 1 suits short commands; try 5 for long dictation)"
+    )
+    parser.add_argument(
+        "--preloaded-model-path",
+        default=None,
+        help="Directory holding already-downloaded Whisper models"
+    )
+    parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        default=0,
+        help="CPU inference threads (default: one per physical core)"
+    )
+    parser.add_argument(
+        "--pin-cores",
+        action="store_true",
+        help="Pin the process to one logical CPU per physical core (Linux)"
+    )
+    parser.add_argument(
+        "--socket",
+        default=SOCKET_PATH,
+        help="UNIX socket path to listen on"
+    )
+    args = parser.parse_args()
+
+    if args.pin_cores:
+        pin_to_physical_cores(args.cpu_threads)
+    sys.stdout = ContextStdout(sys.stdout)
+    server = SSHDragonServer(
+        model_size=args.model,
+        device=args.device,
+        compute_type=args.compute_type,
+        backend_uri=args.backend,
+        beam_size=args.beam_size,
+        model_path=args.preloaded_model_path,
+        cpu_threads=args.cpu_threads
+    )
+    server.connect()
+
+    try:
+        asyncio.run(DragonDaemon(server, args.socket).serve())
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down...")
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,8 @@ Dragon Dictation - Surgical Command Center Integration
 Connects voice dictation to the backend server with real-time updates
 """
 import argparse
-import json
-import os
-import sys
-import tempfile
 import threading
 import queue
-import asyncio
-from datetime import datetime
-from pathlib import Path
 
 # GUI Library
 import tkinter as tk
@@ -20,50 +13,26 @@ from tkinter import scrolledtext
 
 # Core Libraries
 import numpy as np
-import sounddevice as sd
-import soundfile as sf
 from pynput import keyboard
 import pyperclip
 
 # Import our custom modules
-from vascular_commands import VascularCommandParser
-from websocket_client import WebSocketClient
-
-try:
-    from faster_whisper import WhisperModel
-except ImportError:
-    print("\n[ERROR] faster-whisper not installed. Run: pip install faster-whisper\n", file=sys.stderr)
-    sys.exit(1)
+from dragon_core import DragonBase, start_event_loop
 
 # --- Configuration ---
-DEFAULT_SR = 16000
-CHANNELS = 1
 TOGGLE_KEY = 'r'
-CONFIG_DIR = Path("config")
+_COLORS = {"ok": "green", "info": "black", "warn": "orange", "error": "red"}
 
 
-class IntegratedDictationApp:
+class IntegratedDictationApp(DragonBase):
     """Dragon Dictation integrated with Surgical Command Center backend"""
     
     def __init__(self, model_size="small.en", device="auto", compute_type="default", 
                  backend_uri="ws://localhost:3000"):
-        self.is_recording = False
-        self.recorder = Recorder()
-        self.macros = self._load_json(CONFIG_DIR / "macros.json")
-        self.hotwords = self._load_hotwords(CONFIG_DIR / "hotwords.txt")
-        self.transcription_queue = queue.Queue()
-        self.current_procedure_id = None
-        
-        # Initialize command parser
-        self.parser = VascularCommandParser()
-        
-        # Initialize WebSocket client
-        self.ws_client = WebSocketClient(uri=backend_uri)
-        self.ws_connected = False
-        
-        print(f"Loading Whisper model '{model_size}'...")
-        self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
-        print("✅ Model loaded successfully.")
+        super().__init__(model_size, device, compute_type, backend_uri)
+        # One long-lived worker transcribes instead of a thread per recording
+        self._audio_queue = queue.Queue()
+        threading.Thread(target=self._transcribe_worker, daemon=True).start()
 
         # --- GUI Setup ---
         self.root = tk.Tk()
@@ -118,38 +87,41 @@ class IntegratedDictationApp:
         )
         save_button.pack(side=tk.RIGHT, padx=2)
 
-    def _load_json(self, path: Path) -> dict:
-        if not path.exists(): 
-            print(f"⚠️ Warning: {path} not found")
-            return {}
-        with open(path, "r", encoding="utf-8") as f: 
-            return json.load(f)
+    # --- Output sink: the Tk text widget and status bar ---
+
+    def notify(self, message: str, level: str = "info"):
+        # May be called from the event loop thread; Tk updates go through root.after
+        self.root.after(0, self.update_status, message, _COLORS.get(level, "black"))
+
+    def get_buffer(self) -> str:
+        return self.text_widget.get("1.0", tk.END).strip()
+
+    def set_buffer(self, text: str):
+        self.text_widget.replace("1.0", tk.END, text)
 
-    def _load_hotwords(self, path: Path) -> list:
-        if not path.exists(): 
-            print(f"⚠️ Warning: {path} not found")
-            return []
-        with open(path, "r", encoding="utf-8") as f: 
-            return [line.strip() for line in f if line.strip()]
+    def append_text(self, text: str):
+        self.text_widget.insert(tk.END, text)
+
+    def fill_field(self, field: str, value: str) -> bool:
+        return self._replace_placeholder(f"{{{field}}}", value)
+
+    def _replace_placeholder(self, placeholder: str, value: str) -> bool:
+        """Replace the first placeholder in the text widget, in place"""
+        idx = self.text_widget.search(placeholder, "1.0", tk.END)
+        if not idx:
+            return False
+        self.text_widget.replace(idx, f"{idx}+{len(placeholder)}c", value)
+        return True
+
+    # --- GUI control ---
 
     def connect_to_backend(self):
         """Connect to backend server via WebSocket"""
         async def connect():
-            try:
-                await self.ws_client.connect()
-                self.ws_connected = True
-                self.root.after(0, self.update_ws_status, True)
-                print("✅ Connected to backend server")
-            except Exception as e:
-                print(f"❌ Failed to connect to backend: {e}")
-                self.root.after(0, self.update_ws_status, False)
+            await super(IntegratedDictationApp, self).connect_to_backend()
+            self.root.after(0, self.update_ws_status, self.ws_connected)
         
-        # Run in separate thread
-        thread = threading.Thread(
-            target=lambda: asyncio.run(connect()), 
-            daemon=True
-        )
-        thread.start()
+        self._submit(connect())
 
     def update_ws_status(self, connected: bool):
         """Update WebSocket status indicator"""
@@ -168,7 +140,7 @@ class IntegratedDictationApp:
     def save_procedure_manual(self):
         """Manually save procedure via button"""
         if self.ws_connected:
-            asyncio.run(self.save_procedure())
+            self._submit(self.save_procedure(self.get_buffer()))
         else:
             self.update_status("Cannot save - backend not connected", "red")
 
@@ -177,184 +149,48 @@ class IntegratedDictationApp:
             # --- Stop Recording ---
             self.update_status("Transcribing...", "orange")
             self.is_recording = False
-            audio_file = self.recorder.stop_recording()
-            if audio_file:
-                threading.Thread(
-                    target=self.transcribe_audio_thread, 
-                    args=(audio_file,), 
-                    daemon=True
-                ).start()
+            audio = self.recorder.stop_recording()
+            if audio is not None:
+                self._audio_queue.put(audio)
         else:
             # --- Start Recording ---
             self.update_status("🔴 Recording...", "red")
             self.is_recording = True
             self.recorder.start_recording()
             
-    def transcribe_audio_thread(self, audio_path: str):
+    def _transcribe_worker(self):
+        while True:
+            audio = self._audio_queue.get()
+            try:
+                self.transcribe_audio_thread(audio)
+            except Exception as e:
+                # Lose this recording, not the worker every later one needs
+                print(f"❌ Error transcribing: {e}")
+                self.notify(f"Transcription failed: {e}", "error")
+
+    def transcribe_audio_thread(self, audio: np.ndarray):
         """Transcribe audio in background thread"""
-        initial_prompt = ", ".join(self.hotwords)
-        segments, _ = self.model.transcribe(
-            audio_path, 
-            beam_size=5, 
-            initial_prompt=initial_prompt
-        )
-        os.remove(audio_path)
-        
-        full_text = "".join(segment.text for segment in segments).strip()
-        self.transcription_queue.put(full_text)
+        text = self.transcribe(audio)
+        # Hand the result to the Tk thread; no polling needed
+        self.root.after(0, self._on_transcription_ready, text)
     
-    def process_queue(self):
-        """Check queue for transcribed text"""
-        try:
-            text = self.transcription_queue.get_nowait()
-            
-            # Send raw transcription to backend
-            if self.ws_connected:
-                asyncio.run(self.ws_client.send_transcription(text))
-            
-            # Process the command
-            self.process_command(text)
-            
-            self.update_status("Ready | Press 'r' to Record", "black")
-        except queue.Empty:
-            pass
-        finally:
-            self.root.after(100, self.process_queue)
-
-    def process_command(self, text: str):
-        """Process transcribed text for commands"""
+    def _on_transcription_ready(self, text: str):
+        """Apply a finished transcription on the Tk thread"""
         print(f"\n🎙️ Transcribed: {text}")
         
-        # Try to parse as vascular command
-        result = self.parser.parse(text)
-        
-        if result:
-            command_type, params = result
-            print(f"✅ Parsed command: {command_type} - {params}")
-            
-            # Handle different command types
-            if command_type == "insert_macro":
-                self.handle_insert_macro(params)
-            
-            elif command_type == "set_field":
-                self.handle_set_field(params)
-            
-            elif command_type == "set_vessel_field":
-                self.handle_set_vessel_field(params)
-            
-            elif command_type == "save_procedure":
-                if self.ws_connected:
-                    asyncio.run(self.save_procedure())
-            
-            elif command_type == "clear_buffer":
-                self.text_widget.delete("1.0", tk.END)
-                self.update_status("Buffer cleared", "orange")
-            
-            elif command_type == "show_fields":
-                self.show_remaining_fields()
-            
-            # Send command to backend
-            if self.ws_connected:
-                asyncio.run(self.ws_client.send_command(command_type, params))
-        
-        else:
-            # Not a command, just append text
-            self.text_widget.insert(tk.END, " " + text)
-            print("ℹ️ Appended as text")
-
-    def handle_insert_macro(self, params):
-        """Insert a macro template"""
-        macro_name = params.get("macro_name", "vascular_procedure")
-        
-        if macro_name in self.macros:
-            template = self.macros[macro_name]
-            if "{date}" in template:
-                template = template.replace(
-                    "{date}", 
-                    datetime.now().strftime("%B %d, %Y")
-                )
-            
-            self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert("1.0", template)
-            self.update_status(f"Loaded template: {macro_name}", "green")
-        else:
-            self.update_status(f"Macro not found: {macro_name}", "red")
-
-    def handle_set_field(self, params):
-        """Set a standard procedure field"""
-        field = params.get("field")
-        value = params.get("value")
-        placeholder = f"{{{field}}}"
-        
-        current_text = self.text_widget.get("1.0", tk.END)
-        if placeholder in current_text:
-            new_text = current_text.replace(placeholder, value, 1)
-            self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert("1.0", new_text)
-            self.update_status(f"Set {field} = {value}", "green")
-        else:
-            self.update_status(f"Field {field} not found in template", "orange")
-
-    def handle_set_vessel_field(self, params):
-        """Set a vessel-specific field"""
-        vessel = params.get("vessel")
-        prop = params.get("property")
-        value = params.get("value")
-        
-        placeholder = f"{{{vessel}_{prop}}}"
-        
-        current_text = self.text_widget.get("1.0", tk.END)
-        if placeholder in current_text:
-            new_text = current_text.replace(placeholder, value, 1)
-            self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert("1.0", new_text)
-            self.update_status(f"Set {vessel} {prop} = {value}", "green")
-        else:
-            # Try alternate format
-            alt_placeholder = f"{{{vessel}}}"
-            if alt_placeholder in current_text:
-                vessel_text = f"Occlusion: {value}" if prop == "occlusion_length" else f"Treatment: {value}"
-                new_text = current_text.replace(alt_placeholder, vessel_text, 1)
-                self.text_widget.delete("1.0", tk.END)
-                self.text_widget.insert("1.0", new_text)
-                self.update_status(f"Updated {vessel}", "green")
-
-    def show_remaining_fields(self):
-        """Show remaining unfilled fields"""
-        import re
-        current_text = self.text_widget.get("1.0", tk.END)
-        fields = re.findall(r'\{([^}]+)\}', current_text)
+        # Process the command and forward it to the backend
+        self.handle_transcription(text)
         
-        if fields:
-            fields_str = ", ".join(fields[:5])
-            if len(fields) > 5:
-                fields_str += f"... ({len(fields)} total)"
-            self.update_status(f"Remaining fields: {fields_str}", "blue")
-        else:
-            self.update_status("All fields filled!", "green")
-
-    async def save_procedure(self):
-        """Save procedure to backend database"""
-        try:
-            # Get current text
-            procedure_text = self.text_widget.get("1.0", tk.END).strip()
-            
-            # Send save command
-            await self.ws_client.send_command("save_procedure", {
-                "narrative": procedure_text,
-                "status": "completed"
-            })
-            
-            self.update_status("Procedure saved to database!", "green")
-        except Exception as e:
-            print(f"Error saving procedure: {e}")
-            self.update_status(f"Save failed: {e}", "red")
+        self.update_status("Ready | Press 'r' to Record", "black")
 
     def update_status(self, message, color="black"):
         self.status_label.config(text=f"Status: {message}", fg=color)
 
     def start_app(self):
         """Start the application"""
+        # One long-lived event loop keeps the WebSocket connection usable
+        self._loop = start_event_loop()
+        
         # Connect to backend
         self.connect_to_backend()
         
@@ -365,9 +201,6 @@ class IntegratedDictationApp:
         )
         listener_thread.start()
         
-        # Start processing queue
-        self.process_queue()
-        
         # Start GUI
         print("\n" + "="*60)
         print("🏥 Surgical Command Center - Dragon Dictation")
@@ -391,38 +224,6 @@ class IntegratedDictationApp:
             listener.join()
 
 
-class Recorder:
-    """Simple audio recorder"""
-    def __init__(self, samplerate=DEFAULT_SR, channels=CHANNELS):
-        self.samplerate = samplerate
-        self.channels = channels
-        self._frames = []
-        self._stream = None
-
-    def start_recording(self):
-        self._frames = []
-        self._stream = sd.InputStream(
-            samplerate=self.samplerate,
-            channels=self.channels,
-            callback=lambda d, f, t, s: self._frames.append(d.copy()),
-            dtype='float32'
-        )
-        self._stream.start()
-
-    def stop_recording(self):
-        if not self._stream: 
-            return None
-        self._stream.stop()
-        self._stream.close()
-
-        if not self._frames: 
-            return None
-        audio_data = np.concatenate(self._frames, axis=0)
-        temp_file = tempfile.mktemp(suffix=".wav", prefix="dictation_")
-        sf.write(temp_file, audio_data, self.samplerate)
-        return temp_file
-
-
 def main():
     parser = argparse.ArgumentParser(
         description="Dragon Dictation - Surgical Command Center Integration"
@@ -440,7 +241,7 @@ def main():
     parser.add_argument(
         "--compute_type", 
         default="default", 
-        help="Compute type"
+        help="Compute type (default: int8 on CPU, int8_float16 on CUDA)"
     )
     parser.add_argument(
         "--backend", 
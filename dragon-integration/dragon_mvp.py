@@ -16,14 +16,13 @@ Dependencies:
 Author: ChatGPT
 """
 import argparse
+import importlib.util
 import json
-import os
 import re
 import sys
-import tempfile
 import threading
 import queue
-from datetime import datetime
+from datetime import date
 from pathlib import Path
 
 # GUI Library
@@ -32,34 +31,61 @@ from tkinter import scrolledtext
 
 # Core Libraries
 import numpy as np
-import sounddevice as sd
-import soundfile as sf
 from dateutil.parser import parse as parse_date
-from pynput import keyboard
 import pyperclip
 
 try:
-    from faster_whisper import WhisperModel
+    from pynput import keyboard  # Optional: only for --global-hotkey
 except ImportError:
+    keyboard = None
+
+# Import our custom modules
+from dragon_core import Recorder, load_hotwords, load_whisper_model, ChunkDecoder, pin_to_physical_cores, render_macro, warm_up
+
+# faster-whisper is imported when the model loads; only check it is installed
+if importlib.util.find_spec("faster_whisper") is None:
     print("\n[ERROR] faster-whisper not installed. In your conda env, run:\n  pip install faster-whisper\n", file=sys.stderr)
     sys.exit(1)
 
 # --- Configuration ---
-DEFAULT_SR = 16000
-CHANNELS = 1
 TOGGLE_KEY = 'r'
 CONFIG_DIR = Path("config")
 
 class DictationApp:
-    def __init__(self, model_size="small.en", device="auto", compute_type="default"):
+    # insert <macro> | set/fill <field> to/is/as <value>, matched in one pass;
+    # Whisper often punctuates around "insert" ("Insert, vascular procedure.")
+    _CMD_RE = re.compile(
+        r"[.,]*insert[\s.,]+(?P<macro>.+)"
+        r"|(?:set|fill)\s+(?P<field>[\w\s]+?)\s+(?:to|is|as)\s+(?P<value>.+)",
+        re.IGNORECASE
+    )
+    # Spoken macro name -> key: lowercase, spaces to "_", punctuation dropped
+    _MACRO_KEY_TABLE = bytes.maketrans(
+        b"ABCDEFGHIJKLMNOPQRSTUVWXYZ ", b"abcdefghijklmnopqrstuvwxyz_"
+    )
+
+    def __init__(self, model_size="small.en", device="auto", compute_type="default", beam_size=1,
+                 model_path=None, cpu_threads=0, global_hotkey=False):
         self.is_recording = False
-        self.recorder = Recorder()
+        self.global_hotkey = global_hotkey
+        self.beam_size = beam_size
+        self.recorder = Recorder(on_chunk=self._on_chunk)
+        # Decodes finished chunks while recording continues
+        self._decoder = ChunkDecoder(self._transcribe)
+        self._pending = []
         self.macros = self._load_json(CONFIG_DIR / "macros.json")
-        self.hotwords = self._load_hotwords(CONFIG_DIR / "hotwords.txt")
-        self.transcription_queue = queue.Queue()
+        self.hotwords, self._initial_prompt = load_hotwords(CONFIG_DIR / "hotwords.txt")
+        # One long-lived worker collects results instead of a thread per recording
+        self._work_queue = queue.Queue()
+        threading.Thread(target=self._transcribe_worker, daemon=True).start()
 
         print(f"Loading Whisper model '{model_size}'...")
-        self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
+        from faster_whisper import BatchedInferencePipeline
+        self.model = BatchedInferencePipeline(model=load_whisper_model(
+            model_size, device, compute_type,
+            download_root=model_path, cpu_threads=cpu_threads
+        ))
+        warm_up(self.model)
         print("Model loaded successfully.")
 
         # --- GUI Setup ---
@@ -83,10 +109,6 @@ class DictationApp:
         if not path.exists(): return {}
         with open(path, "r", encoding="utf-8") as f: return json.load(f)
 
-    def _load_hotwords(self, path: Path) -> list:
-        if not path.exists(): return []
-        with open(path, "r", encoding="utf-8") as f: return [line.strip() for line in f if line.strip()]
-
     def copy_to_clipboard(self):
         text_to_copy = self.text_widget.get("1.0", tk.END)
         pyperclip.copy(text_to_copy)
@@ -97,139 +119,139 @@ class DictationApp:
             # --- Stop Recording ---
             self.update_status("Transcribing...", "orange")
             self.is_recording = False
-            audio_file = self.recorder.stop_recording()
-            if audio_file:
-                # Transcribe in a separate thread to not freeze the GUI
-                threading.Thread(target=self.transcribe_audio_thread, args=(audio_file,), daemon=True).start()
+            audio = self.recorder.stop_recording()
+            pending, self._pending = self._pending, []
+            if audio is not None:
+                pending.append(self._decoder.submit(audio))
+            if pending:
+                # Transcribe on the worker thread to not freeze the GUI
+                self._work_queue.put(pending)
         else:
             # --- Start Recording ---
             self.update_status("Recording...", "red")
             self.is_recording = True
             self.recorder.start_recording()
             
-    def transcribe_audio_thread(self, audio_path: str):
+    def _on_chunk(self, samples: np.ndarray):
+        """Start decoding a full chunk while the user keeps talking"""
+        self._pending.append(self._decoder.submit(samples))
+
+    def _transcribe(self, audio: np.ndarray):
+        """Run the batched pipeline; ChunkDecoder collects the segments"""
+        segments, _ = self.model.transcribe(
+            audio, batch_size=8, beam_size=self.beam_size, initial_prompt=self._initial_prompt,
+            # Drop leading/trailing silence before the encoder sees it
+            vad_filter=True, vad_parameters={"min_silence_duration_ms": 300}
+        )
+        return segments
+
+    def _transcribe_worker(self):
+        while True:
+            pending = self._work_queue.get()
+            try:
+                self.transcribe_audio_thread(pending)
+            except Exception as e:
+                # Lose this recording, not the worker every later one needs
+                print(f"Transcription failed: {e}")
+                self.root.after(0, self.update_status, f"Transcription failed: {e}", "red")
+
+    def transcribe_audio_thread(self, pending: list):
         """Runs in a background thread."""
-        initial_prompt = ", ".join(self.hotwords)
-        segments, _ = self.model.transcribe(audio_path, beam_size=5, initial_prompt=initial_prompt)
-        os.remove(audio_path)
-        
-        full_text = "".join(segment.text for segment in segments).strip()
-        # Put the result in a queue to safely pass it to the main GUI thread
-        self.transcription_queue.put(full_text)
-    
-    def process_queue(self):
-        """Checks the queue for transcribed text and updates the GUI."""
-        try:
-            text = self.transcription_queue.get_nowait()
-            self.process_command(text)
-            self.update_status("Idle | Press 'r' to Record", "black")
-        except queue.Empty:
-            pass # No new transcriptions
-        finally:
-            self.root.after(100, self.process_queue) # Check again in 100ms
+        full_text = " ".join(text for text in (f.result() for f in pending) if text)
+        # Hand the result to the main GUI thread; no polling needed
+        self.root.after(0, self._on_transcription_ready, full_text)
+
+    def _on_transcription_ready(self, text: str):
+        """Runs on the GUI thread once a transcription is done."""
+        self.process_command(text)
+        self.update_status("Idle | Press 'r' to Record", "black")
 
     def process_command(self, text: str):
         """Processes the transcribed text for commands or appends it."""
-        # Clean the text for better command matching
-        text_lower_clean = text.lower().strip().replace(".", "").replace(",", "")
-        
+        match = self._CMD_RE.match(text.strip())
+
         # Command: insert <macro>
-        if text_lower_clean.startswith("insert "):
-            macro_key = text_lower_clean.split(" ", 1)[1].strip().replace(" ", "_")
+        if match and match.group("macro"):
+            macro_key = match.group("macro").encode().translate(self._MACRO_KEY_TABLE, b".,?!").strip(b"_").decode()
             if macro_key in self.macros:
-                template = self.macros[macro_key]
-                if "{date}" in template:
-                    template = template.replace("{date}", datetime.now().strftime("%B %d, %Y"))
-                self.text_widget.delete("1.0", tk.END)
-                self.text_widget.insert("1.0", template)
+                template = render_macro(self.macros[macro_key], date.today())
+                self.text_widget.replace("1.0", tk.END, template)
                 self.update_status(f"Inserted macro: '{macro_key}'")
                 return
 
         # Command: set <field> to <value>
-        match = re.match(r"(?:set|fill)\s+([\w\s]+?)\s+(?:to|is|as)\s+(.+)", text, re.IGNORECASE)
-        if match:
-            field, value = match.groups()
-            field = field.strip().replace(" ", "_")
-            value = value.strip()
+        elif match:
+            field = match.group("field").strip().replace(" ", "_")
+            value = match.group("value").strip()
             placeholder = f"{{{field}}}"
             
-            current_text = self.text_widget.get("1.0", tk.END)
-            if placeholder in current_text:
-                new_text = current_text.replace(placeholder, value, 1)
-                self.text_widget.delete("1.0", tk.END)
-                self.text_widget.insert("1.0", new_text)
+            if self._replace_placeholder(placeholder, value):
                 self.update_status(f"Filled field '{field}'")
             return
 
         # No command, just append text
         self.text_widget.insert(tk.END, " " + text)
 
+    def _replace_placeholder(self, placeholder: str, value: str) -> bool:
+        """Replace the first placeholder in the text widget, in place"""
+        idx = self.text_widget.search(placeholder, "1.0", tk.END)
+        if not idx:
+            return False
+        self.text_widget.replace(idx, f"{idx}+{len(placeholder)}c", value)
+        return True
+
     def update_status(self, message, color="black"):
         self.status_label.config(text=f"Status: {message}", fg=color)
 
     def start_app(self):
-        """Starts the keyboard listener and the GUI main loop."""
-        # Run keyboard listener in a separate thread
-        listener_thread = threading.Thread(target=self.start_keyboard_listener, daemon=True)
-        listener_thread.start()
-        
-        # Start processing the queue
-        self.process_queue()
+        """Binds the hotkey and starts the GUI main loop."""
+        # The global listener also fires while the window has focus, so bind
+        # only one of them or a single press would toggle twice
+        if self.global_hotkey:
+            self.start_keyboard_listener()
+        else:
+            # Handled by the Tk event loop: no listener thread, no system-wide hook
+            self.root.bind_all(f"<KeyPress-{TOGGLE_KEY}>", self._on_hotkey)
         
         # Start the GUI
         print("GUI is running. The dictation window should be open.")
-        print("Press 'r' in any application to toggle recording.")
+        if self.global_hotkey:
+            print("Press 'r' in any application to toggle recording.")
+        else:
+            print("Press 'r' in the window (outside the text box) to toggle recording.")
         self.root.mainloop()
 
-    def start_keyboard_listener(self):
-        def on_press(key):
-            try:
-                if key.char == TOGGLE_KEY:
-                    self.toggle_recording()
-            except AttributeError:
-                pass # Ignore special keys like Shift, Ctrl, etc.
-        
-        with keyboard.Listener(on_press=on_press) as listener:
-            listener.join()
-
-
-class Recorder:
-    """A simple audio recorder."""
-    def __init__(self, samplerate=DEFAULT_SR, channels=CHANNELS):
-        self.samplerate = samplerate
-        self.channels = channels
-        self._frames = []
-        self._stream = None
-
-    def start_recording(self):
-        self._frames = []
-        self._stream = sd.InputStream(
-            samplerate=self.samplerate,
-            channels=self.channels,
-            callback=lambda d, f, t, s: self._frames.append(d.copy()),
-            dtype='float32'
-        )
-        self._stream.start()
+    def _on_hotkey(self, event):
+        # Typing an 'r' into the narrative must not toggle recording
+        if not isinstance(event.widget, tk.Text):
+            self.toggle_recording()
 
-    def stop_recording(self) -> str | None:
-        if not self._stream: return None
-        self._stream.stop()
-        self._stream.close()
+    def start_keyboard_listener(self):
+        """Global hotkey, for toggling while another application has focus"""
+        if keyboard is None:
+            print("pynput not installed; --global-hotkey ignored. Run: pip install pynput")
+            return
+        # A single registered hotkey; toggling is handed to the Tk thread
+        listener = keyboard.GlobalHotKeys({TOGGLE_KEY: lambda: self.root.after(0, self.toggle_recording)})
+        listener.daemon = True
+        listener.start()
 
-        if not self._frames: return None
-        audio_data = np.concatenate(self._frames, axis=0)
-        temp_file = tempfile.mktemp(suffix=".wav", prefix="dictation_")
-        sf.write(temp_file, audio_data, self.samplerate)
-        return temp_file
 
 def main():
     parser = argparse.ArgumentParser(description="Dragon-like Medical Dictation App (GUI Edition)")
     parser.add_argument("--model", default="small.en", help="Faster-Whisper model size")
     parser.add_argument("--device", default="auto", help="Device ('cpu', 'cuda', 'auto')")
-    parser.add_argument("--compute_type", default="default", help="Compute type ('int8', 'float16', 'float32')")
+    parser.add_argument("--compute_type", default="default", help="Compute type (default: int8 on CPU, int8_float16 on CUDA)")
+    parser.add_argument("--beam_size", type=int, default=1, help="Decoder beam width (greedy 1 suits short commands; try 5 for long dictation)")
+    parser.add_argument("--preloaded-model-path", default=None, help="Directory holding already-downloaded Whisper models")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="CPU inference threads (default: one per physical core)")
+    parser.add_argument("--pin-cores", action="store_true", help="Pin the process to one logical CPU per physical core (Linux)")
+    parser.add_argument("--global-hotkey", action="store_true", help="Toggle with 'r' from any application (needs pynput)")
     args = parser.parse_args()
 
-    app = DictationApp(model_size=args.model, device=args.device, compute_type=args.compute_type)
+    if args.pin_cores:
+        pin_to_physical_cores(args.cpu_threads)
+    app = DictationApp(model_size=args.model, device=args.device, compute_type=args.compute_type, beam_size=args.beam_size, model_path=args.preloaded_model_path, cpu_threads=args.cpu_threads, global_hotkey=args.global_hotkey)
     app.start_app()
 
 if __name__ == "__main__":
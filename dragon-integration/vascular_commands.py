@@ -5,12 +5,58 @@ Parses voice commands specific to vascular procedures
 """
 import re
 import json
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Every command in one anchored alternation, tried in priority order;
+# the matching branch is read back from lastgroup
+_COMMAND_RE = re.compile(
+    r"(?P<insert_macro>insert .*(?:vascular|procedure))"
+    r"|(?P<set>(?:set|fill)\s+(?P<field>.+?)\s+(?:to|is|as)\s+(?P<value>.+))"
+    r"|(?P<save_procedure>.*(?:save procedure|save note|complete procedure))"
+    r"|(?P<clear_buffer>.*(?:clear buffer|start over))"
+    r"|(?P<show_fields>.*(?:show fields|what fields))",
+    re.DOTALL
+)
+# Shortest text any branch can match ("save note"); shorter input is dictation
+_MIN_COMMAND_LEN = 9
+_DECIMAL_RE = re.compile(r'\d+\.?\d*')
+_INTEGER_RE = re.compile(r'\d+')
+_TASC_LETTERS = frozenset("abcdABCD")
+
+# Spoken keyword -> canonical value, checked in order (first hit wins);
+# read-only, built once at import
+_TREATMENTS = MappingProxyType({
+    "pta": "PTA",
+    "angioplasty": "PTA",
+    "balloon": "PTA",
+    "stent": "Stent",
+    "stenting": "Stent",
+    "atherectomy": "Atherectomy",
+    "tpa": "TPA",
+    "thrombolysis": "Mechanical Thrombolysis"
+})
+_CALCIFICATION = MappingProxyType({"none": "none", "mild": "mild", "moderate": "moderate",
+                                   "severe": "severe", "heavy": "severe"})
+_SIDES = MappingProxyType({"left": "left", "right": "right", "both": "bilateral",
+                           "bilateral": "bilateral"})
+_ACCESS_SITES = MappingProxyType({"femoral": "femoral", "radial": "radial", "brachial": "brachial",
+                                  "pop": "popliteal"})  # "pop" also covers "popliteal"
+_CLOSURES = MappingProxyType({"mynx": "mynx", "manual": "manual", "pressure": "manual"})
+
+
+def _match_keyword(value_lower: str, keywords: Mapping[str, str]) -> Optional[str]:
+    """Canonical value for the first keyword found in value_lower, if any"""
+    for key, normalized in keywords.items():
+        if key in value_lower:
+            return normalized
+    return None
+
 
 class VascularCommandParser:
     """Parse vascular procedure voice commands"""
@@ -23,6 +69,25 @@ class VascularCommandParser:
             "anterior tibial", "posterior tibial", "peroneal",
             "tibial peroneal trunk"
         ]
+        # All vessels in one pass; longest first so "tibial peroneal trunk"
+        # is not read as "peroneal"
+        self._vessel_re = re.compile("|".join(
+            re.escape(name) for name in sorted(self.vessel_names, key=len, reverse=True)
+        ))
+        # Spoken name -> payload key, built once instead of per command
+        self._vessel_keys = {name: name.replace(" ", "_") for name in self.vessel_names}
+        # Standard field keyword -> (field, normalizer), found with one search
+        self._field_dispatch = {
+            "side": ("procedure_side", self._normalize_side),
+            "laterality": ("procedure_side", self._normalize_side),
+            "access": ("access_site", self._normalize_access),
+            "sheath": ("sheath_size", self._normalize_sheath),
+            "closure": ("closure_method", self._normalize_closure),
+            "mynx": ("closure_method", self._normalize_closure)
+        }
+        self._field_re = re.compile("|".join(self._field_dispatch))
+        # Whisper often repeats an utterance verbatim; parse each text once
+        self._parse_cached = lru_cache(maxsize=64)(self._parse)
     
     def _load_mappings(self, path: Path) -> Dict:
         """Load field mappings from JSON"""
@@ -38,106 +103,88 @@ class VascularCommandParser:
         Parse voice command and return (command_type, params)
         
         Returns:
-            Tuple of (command, params) or None if not a command
+            Tuple of (command, params) or None if not a command.
+            Each call gets its own params dict, even on a cache hit.
         """
+        result = self._parse_cached(text)
+        if result is None:
+            return None
+        command, params = result
+        return command, dict(params)
+    
+    def _parse(self, text: str) -> Optional[Tuple[str, Dict[str, Any]]]:
         text_clean = text.lower().strip()
+        if len(text_clean) < _MIN_COMMAND_LEN:
+            return None
         
-        # Insert macro command
-        if text_clean.startswith("insert "):
-            macro_name = text_clean.replace("insert ", "").strip()
-            if "vascular" in macro_name or "procedure" in macro_name:
-                return ("insert_macro", {"macro_name": "vascular_procedure"})
-        
-        # Set field command
-        set_match = re.match(
-            r"(?:set|fill)\s+(.+?)\s+(?:to|is|as)\s+(.+)",
-            text_clean,
-            re.IGNORECASE
-        )
-        if set_match:
-            field_name, value = set_match.groups()
-            return self._parse_set_command(field_name.strip(), value.strip())
+        match = _COMMAND_RE.match(text_clean)
+        if not match:
+            return None
         
-        # Save procedure command
-        if any(keyword in text_clean for keyword in ["save procedure", "save note", "complete procedure"]):
-            return ("save_procedure", {})
+        command = match.lastgroup
+        if command == "set":
+            return self._parse_set_command(
+                match.group("field").strip(), match.group("value").strip()
+            )
+        if command == "insert_macro":
+            return ("insert_macro", {"macro_name": "vascular_procedure"})
         
-        # Clear buffer command
-        if "clear buffer" in text_clean or "start over" in text_clean:
-            return ("clear_buffer", {})
-        
-        # Show fields command
-        if "show fields" in text_clean or "what fields" in text_clean:
-            return ("show_fields", {})
-        
-        return None
+        return (command, {})
+    
+    def parse_batch(self, texts: List[str]) -> List[Optional[Tuple[str, Dict[str, Any]]]]:
+        """Parse many transcripts, e.g. when replaying logged dictation"""
+        # Replayed transcripts are mostly distinct, so the LRU would only
+        # hash and evict; each text gets fresh params from _parse anyway
+        parse = self._parse
+        return [parse(text) for text in texts]
     
     def _parse_set_command(self, field_name: str, value: str) -> Tuple[str, Dict]:
         """Parse a 'set field to value' command"""
         
         # Check if it's a vessel-specific field
-        for vessel in self.vessel_names:
-            if vessel in field_name:
-                vessel_key = vessel.replace(" ", "_")
-                
-                # Determine what property of the vessel
-                if "occlusion" in field_name or "length" in field_name:
-                    return ("set_vessel_field", {
-                        "vessel": vessel_key,
-                        "property": "occlusion_length",
-                        "value": self._normalize_length(value)
-                    })
-                
-                elif "treatment" in field_name:
-                    return ("set_vessel_field", {
-                        "vessel": vessel_key,
-                        "property": "treatment",
-                        "value": self._normalize_treatment(value)
-                    })
-                
-                elif "tasc" in field_name:
-                    return ("set_vessel_field", {
-                        "vessel": vessel_key,
-                        "property": "tasc",
-                        "value": self._normalize_tasc(value)
-                    })
-                
-                elif "calcification" in field_name:
-                    return ("set_vessel_field", {
-                        "vessel": vessel_key,
-                        "property": "calcification",
-                        "value": self._normalize_calcification(value)
-                    })
+        vessel_match = self._vessel_re.search(field_name)
+        if vessel_match:
+            vessel_key = self._vessel_keys[vessel_match.group(0)]
+            
+            # Determine what property of the vessel
+            if "occlusion" in field_name or "length" in field_name:
+                return ("set_vessel_field", {
+                    "vessel": vessel_key,
+                    "property": "occlusion_length",
+                    "value": self._normalize_length(value)
+                })
+            
+            elif "treatment" in field_name:
+                return ("set_vessel_field", {
+                    "vessel": vessel_key,
+                    "property": "treatment",
+                    "value": self._normalize_treatment(value)
+                })
+            
+            elif "tasc" in field_name:
+                return ("set_vessel_field", {
+                    "vessel": vessel_key,
+                    "property": "tasc",
+                    "value": self._normalize_tasc(value)
+                })
+            
+            elif "calcification" in field_name:
+                return ("set_vessel_field", {
+                    "vessel": vessel_key,
+                    "property": "calcification",
+                    "value": self._normalize_calcification(value)
+                })
         
         # Standard procedure fields
         field_map = self.mappings.get("procedure_fields", {})
         
-        # Procedure side
-        if "side" in field_name or "laterality" in field_name:
+        # Procedure side, access site, sheath size, closure method
+        keyword = self._field_re.search(field_name)
+        if keyword:
+            field, normalize = self._field_dispatch[keyword.group(0)]
             return ("set_field", {
-                "field": "procedure_side",
-                "value": self._normalize_side(value)
-            })
-        
-        # Access site
-        if "access" in field_name:
-            return ("set_field", {
-                "field": "access_site",
-                "value": self._normalize_access(value)
-            })
-        
-        # Sheath size
-        if "sheath" in field_name:
-            return ("set_field", {
-                "field": "sheath_size",
-                "value": self._normalize_sheath(value)
-            })
-        
-        # Closure method
-        if "closure" in field_name or "mynx" in field_name:
-            return ("set_field", {
-                "field": "closure_method",
-                "value": self._normalize_closure(value)
+                "field": field,
+                "value": normalize(value)
             })
         
         # Default: treat as generic field
@@ -148,10 +195,10 @@ class VascularCommandParser:
     
     def _normalize_length(self, value: str) -> str:
         """Normalize occlusion length"""
-        # Extract numbers
-        numbers = re.findall(r'\d+\.?\d*', value)
-        if numbers:
-            length = numbers[0]
+        # Extract the first number
+        number = _DECIMAL_RE.search(value)
+        if number:
+            length = number.group(0)
             if "centimeter" in value or "cm" in value:
                 return f"{length} cm"
             elif "millimeter" in value or "mm" in value:
@@ -161,17 +208,6 @@ class VascularCommandParser:
     
     def _normalize_treatment(self, value: str) -> str:
         """Normalize treatment type"""
-        treatments = {
-            "pta": "PTA",
-            "angioplasty": "PTA",
-            "balloon": "PTA",
-            "stent": "Stent",
-            "stenting": "Stent",
-            "atherectomy": "Atherectomy",
-            "tpa": "TPA",
-            "thrombolysis": "Mechanical Thrombolysis"
-        }
-        
         value_lower = value.lower()
         
         # Check for combinations
@@ -179,69 +215,39 @@ class VascularCommandParser:
             return "PTA + Stent"
         
         # Single treatment
-        for key, normalized in treatments.items():
-            if key in value_lower:
-                return normalized
-        
-        return value
+        return _match_keyword(value_lower, _TREATMENTS) or value
     
     def _normalize_tasc(self, value: str) -> str:
         """Normalize TASC classification"""
-        # Extract letter
-        letters = re.findall(r'[a-dA-D]', value)
-        if letters:
-            return letters[0].upper()
+        # First A-D letter; a plain scan is cheaper than a regex for one char
+        for ch in value:
+            if ch in _TASC_LETTERS:
+                return ch.upper()
         return value.upper()
     
     def _normalize_calcification(self, value: str) -> str:
         """Normalize calcification level"""
-        if "none" in value.lower():
-            return "none"
-        elif "mild" in value.lower():
-            return "mild"
-        elif "moderate" in value.lower():
-            return "moderate"
-        elif "severe" in value.lower() or "heavy" in value.lower():
-            return "severe"
-        return value
+        return _match_keyword(value.lower(), _CALCIFICATION) or value
     
     def _normalize_side(self, value: str) -> str:
         """Normalize procedure side"""
-        if "left" in value.lower():
-            return "left"
-        elif "right" in value.lower():
-            return "right"
-        elif "both" in value.lower() or "bilateral" in value.lower():
-            return "bilateral"
-        return value
+        return _match_keyword(value.lower(), _SIDES) or value
     
     def _normalize_access(self, value: str) -> str:
         """Normalize access site"""
-        if "femoral" in value.lower():
-            return "femoral"
-        elif "radial" in value.lower():
-            return "radial"
-        elif "brachial" in value.lower():
-            return "brachial"
-        elif "pop" in value.lower() or "popliteal" in value.lower():
-            return "popliteal"
-        return value
+        return _match_keyword(value.lower(), _ACCESS_SITES) or value
     
     def _normalize_sheath(self, value: str) -> str:
         """Normalize sheath size"""
-        # Extract numbers
-        numbers = re.findall(r'\d+', value)
-        if numbers:
-            return f"{numbers[0]}fr"
+        # Extract the first number
+        number = _INTEGER_RE.search(value)
+        if number:
+            return f"{number.group(0)}fr"
         return value
     
     def _normalize_closure(self, value: str) -> str:
         """Normalize closure method"""
-        if "mynx" in value.lower():
-            return "mynx"
-        elif "manual" in value.lower() or "pressure" in value.lower():
-            return "manual"
-        return value
+        return _match_keyword(value.lower(), _CLOSURES) or value
 
 
 # Test the parser
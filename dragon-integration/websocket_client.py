@@ -5,11 +5,29 @@ Connects Dragon MVP to the Surgical Command Center backend
 """
 import asyncio
 import json
+import struct
+import time
 import websockets
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 import logging
 
+try:
+    import orjson  # Optional: faster JSON for every message on the socket
+except ImportError:
+    orjson = None
+
+# orjson.dumps returns bytes (sent as a binary frame, no str -> bytes step);
+# the backend's JSON.parse accepts either
+if orjson is not None:
+    _dumps, _loads = orjson.dumps, orjson.loads
+else:
+    _dumps, _loads = json.dumps, json.loads
+
+# Transcriptions skip JSON: opcode byte + float64 LE timestamp + UTF-8 text
+TYPE_TRANSCRIPTION = 0x01
+_TRANSCRIPTION_HEADER = struct.Struct("<Bd")
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -18,6 +36,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _frames(batch: list):
+    """Frames for a batch, in order: binary frames as-is, JSON runs coalesced"""
+    run = []
+    for message in batch:
+        if isinstance(message, bytes):
+            if run:
+                yield _dumps(run if len(run) > 1 else run[0])
+                run = []
+            yield message
+        else:
+            run.append(message)
+    if run:
+        yield _dumps(run if len(run) > 1 else run[0])
+
+
 class WebSocketClient:
     """WebSocket client to connect Dragon dictation to backend server"""
     
@@ -27,19 +60,34 @@ class WebSocketClient:
         self.websocket = None
         self.connected = False
         self.client_id = None
+        self._outbox = None  # Messages waiting for the writer task
+        self._writer = None
+        self._listen_task = None
         
     async def connect(self):
         """Establish WebSocket connection to backend"""
         try:
-            self.websocket = await websockets.connect(self.uri)
+            # Pings let a dead backend be noticed instead of looking connected;
+            # frames are small JSON, so per-message deflate only costs CPU
+            self.websocket = await websockets.connect(
+                self.uri,
+                ping_interval=20,
+                ping_timeout=10,
+                max_size=2**20,
+                compression=None
+            )
             self.connected = True
+            
+            # One writer task owns the socket and batches queued messages
+            self._outbox = asyncio.Queue()
+            self._writer = asyncio.create_task(self._drain())
             logger.info(f"✅ Connected to backend at {self.uri}")
             
             # Register as Dragon client
             await self.register()
             
-            # Start listening for responses
-            asyncio.create_task(self.listen())
+            # Start listening for responses; keep the task so close() can stop it
+            self._listen_task = asyncio.create_task(self.listen())
             
         except Exception as e:
             logger.error(f"❌ Failed to connect: {e}")
@@ -55,27 +103,46 @@ class WebSocketClient:
         await self.send(message)
         logger.info(f"📝 Registered as '{self.client_type}' client")
     
-    async def send(self, message: Dict[str, Any]):
-        """Send message to backend"""
+    async def send(self, message: Union[Dict[str, Any], bytes]):
+        """Queue a message (or an already-encoded binary frame) for the backend"""
         if not self.connected or not self.websocket:
             logger.warning("⚠️ Not connected to backend")
             return
         
-        try:
-            await self.websocket.send(json.dumps(message))
-            logger.debug(f"📤 Sent: {message.get('type')}")
-        except Exception as e:
-            logger.error(f"❌ Error sending message: {e}")
+        self._outbox.put_nowait(message)
+    
+    async def _drain(self):
+        """Send queued messages, coalescing a burst into one JSON array frame"""
+        while True:
+            batch = [await self._outbox.get()]
+            while not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            
+            try:
+                for frame in _frames(batch):
+                    await self.websocket.send(frame)
+                logger.debug("📤 Sent %d message(s)", len(batch))
+            except Exception as e:
+                logger.error(f"❌ Error sending message: {e}")
+            finally:
+                for _ in batch:
+                    self._outbox.task_done()
     
     async def send_transcription(self, text: str):
         """Send raw transcription to backend"""
+        frame = _TRANSCRIPTION_HEADER.pack(TYPE_TRANSCRIPTION, time.monotonic())
+        await self.send(frame + text.encode("utf-8"))
+        # %.50s truncates only if the record is actually emitted
+        logger.info("🎙️ Transcription sent: %.50s...", text)
+    
+    async def send_partial(self, text: str):
+        """Send the transcription decoded so far, before the utterance is done"""
         message = {
-            "type": "voice_transcription",
+            "type": "voice_transcription_partial",
             "text": text,
-            "timestamp": asyncio.get_event_loop().time()
+            "timestamp": time.monotonic()
         }
         await self.send(message)
-        logger.info(f"🎙️ Transcription sent: {text[:50]}...")
     
     async def send_command(self, command: str, params: Dict[str, Any]):
         """Send parsed voice command to backend"""
@@ -83,10 +150,10 @@ class WebSocketClient:
             "type": "voice_command",
             "command": command,
             "params": params,
-            "timestamp": asyncio.get_event_loop().time()
+            "timestamp": time.monotonic()
         }
         await self.send(message)
-        logger.info(f"🎤 Command sent: {command}")
+        logger.info("🎤 Command sent: %s", command)
     
     async def send_field_update(self, field: str, value: Any, procedure_id: Optional[str] = None):
         """Send field update to backend"""
@@ -102,7 +169,7 @@ class WebSocketClient:
         """Listen for messages from backend"""
         try:
             async for message in self.websocket:
-                data = json.loads(message)
+                data = _loads(message)
                 await self.handle_message(data)
         except websockets.exceptions.ConnectionClosed:
             logger.warning("⚠️ Connection closed by server")
@@ -115,25 +182,31 @@ class WebSocketClient:
         msg_type = data.get("type")
         
         if msg_type == "connection":
-            logger.info(f"✅ {data.get('message')}")
+            logger.info("✅ %s", data.get("message"))
             
         elif msg_type == "registered":
             self.client_id = data.get("clientId")
-            logger.info(f"✅ Registered with ID: {self.client_id}")
+            logger.info("✅ Registered with ID: %s", self.client_id)
             
         elif msg_type == "field_updated":
-            field = data.get("field")
-            value = data.get("value")
-            logger.info(f"✅ Field updated: {field} = {value}")
+            logger.info("✅ Field updated: %s = %s", data.get("field"), data.get("value"))
             
         elif msg_type == "procedure_saved":
-            logger.info(f"✅ Procedure saved: {data.get('message')}")
+            logger.info("✅ Procedure saved: %s", data.get("message"))
             
         else:
-            logger.debug(f"📨 Received: {msg_type}")
+            logger.debug("📨 Received: %s", msg_type)
     
     async def close(self):
         """Close WebSocket connection"""
+        if self._writer:
+            # Let queued messages go out before the socket closes
+            await self._outbox.join()
+        tasks = [t for t in (self._writer, self._listen_task) if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._writer = self._listen_task = None
         if self.websocket:
             await self.websocket.close()
             self.connected = False
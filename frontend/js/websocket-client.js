@@ -385,6 +385,8 @@ class SurgicalWebSocketClient {
       el.style.opacity = "1";
       setTimeout(() => (el.style.opacity = "0.5"), 5000);
     }
+    // Partials only refresh the live line above; the final text gets logged
+    if (data.partial) return;
     if (this.onTranscriptionCallback) this.onTranscriptionCallback(data.text);
   }
 